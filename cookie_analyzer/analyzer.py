@@ -1,7 +1,20 @@
-from typing import TextIO, Iterator
+import sys
+import mmap
+from typing import TextIO, Iterator, Optional, Callable
 from datetime import datetime, date
 
-from .models import CookieLog, CookiesAnalysis, CookiesDataParser
+from .models import CookiesAnalysis
+
+if sys.version_info < (3, 11):
+    # Before 3.11, fromisoformat only accepts the format emitted by
+    # isoformat() (e.g. no "Z" suffix). When installed, the backport widens
+    # the accepted formats. Note that it patches datetime for the whole
+    # process as a side effect of importing this module.
+    try:
+        from backports.datetime_fromisoformat import MonkeyPatch
+        MonkeyPatch.patch_fromisoformat()
+    except ImportError:
+        pass
 
 
 class CSVFile:
@@ -9,13 +22,21 @@ class CSVFile:
 
      Constants:
          DATA_SEPARATOR: CSV delimiter (comma)
+         ASCII_WHITESPACE: ASCII characters removed by str.strip()
+         READ_BLOCK_SIZE: Number of characters, or bytes of memory-mapped
+             files, split into lines at once
      """
     DATA_SEPARATOR = ","
+    ASCII_WHITESPACE = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+    READ_BLOCK_SIZE = 1 << 22
 
     def __init__(self, file_stream: TextIO) -> None:
         file_stream.seek(0)
         self._file_stream = file_stream
+        self._encoding = getattr(file_stream, "encoding", None) or "utf-8"
+        self._raw_separator = self.DATA_SEPARATOR.encode(self._encoding)
         self._current_line_number = 0
+        self._skipped_lines: Optional[tuple[mmap.mmap, int, int]] = None
 
     @staticmethod
     def extract_data_from_line(line: str) -> list[str]:
@@ -27,44 +48,317 @@ class CSVFile:
         Returns:
             List of whitespace-stripped data elements
         """
-        return [
-            data.strip() for data in line.split(CSVFile.DATA_SEPARATOR)
-        ]
+        return list(map(str.strip, line.split(CSVFile.DATA_SEPARATOR)))
+
+    def _resolve_line_number(self) -> int:
+        """Get the number of the line that was read last.
+
+        Lines skipped by a binary search are only counted when a line
+        number is needed, e.g. to report an error. They are counted on the
+        memory map kept by _iter_lines, so the file isn't mapped again.
+
+        Returns:
+            Number of the line that was read last
+        """
+        if self._skipped_lines is not None:
+            mapped_file, skipped_start, skipped_end = self._skipped_lines
+            self._skipped_lines = None
+            self._current_line_number += self._count_lines(
+                mapped_file, skipped_start, skipped_end
+            )
+        return self._current_line_number
 
     def goto_beginning(self) -> None:
         """Reset file position to the beginning."""
         self._file_stream.seek(0)
         self._current_line_number = 0
+        self._skipped_lines = None
+
+    def _map_file(self) -> Optional[mmap.mmap]:
+        """Memory-map the file backing the stream.
+
+        Returns:
+            Read-only memory map of the file, or None if the stream is not
+            backed by a non-empty file
+        """
+        try:
+            return mmap.mmap(
+                self._file_stream.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except (OSError, ValueError):
+            # In-memory streams have no file descriptor and empty files
+            # cannot be mapped
+            return None
+
+    def _decode(self, value: bytes) -> str:
+        """Decode a raw value using the stream encoding.
+
+        Args:
+            value: Raw value as returned by _iter_lines
+
+        Returns:
+            Decoded value
+        """
+        return value.decode(self._encoding)
+
+    def _strip(self, value: bytes) -> bytes:
+        """Strip whitespace from a raw value the same way str.strip() does.
+
+        ASCII values are stripped of the ASCII characters str.strip()
+        removes, which bytes.strip() alone doesn't fully cover. Values
+        holding other characters are decoded to be stripped.
+
+        Args:
+            value: Raw value
+
+        Returns:
+            Raw value without surrounding whitespace
+        """
+        value = value.strip(self.ASCII_WHITESPACE)
+        if value.isascii():
+            return value
+        return self._decode(value).strip().encode(self._encoding)
+
+    def _iter_stream_lines(self) -> Iterator[bytes]:
+        """Iterate through the raw lines of the stream, reading it in blocks.
+
+        Yields:
+            Raw bytes of each line, without the line terminator
+        """
+        read = self._file_stream.read
+        remainder = b""
+        block = read(self.READ_BLOCK_SIZE)
+
+        while block:
+            lines = (remainder + block.encode(self._encoding)).split(b"\n")
+            remainder = lines.pop()
+            yield from lines
+            block = read(self.READ_BLOCK_SIZE)
+        if remainder:
+            yield remainder
+
+    @staticmethod
+    def _find_line_end(mapped_file: mmap.mmap, line_start: int) -> int:
+        """Find the end of a line in a memory-mapped file.
+
+        Lines may end with "\n", "\r" or "\r\n", as in text mode.
+
+        Args:
+            mapped_file: Memory map of the file
+            line_start: Offset of the line start
+
+        Returns:
+            Offset of the line terminator, or the file size for the last line
+        """
+        line_end = mapped_file.find(b"\n", line_start)
+        if line_end == -1:
+            line_end = len(mapped_file)
+        carriage_return = mapped_file.find(b"\r", line_start, line_end)
+        return line_end if carriage_return == -1 else carriage_return
+
+    @staticmethod
+    def _next_line_start(mapped_file: mmap.mmap, line_end: int) -> int:
+        """Find the start of the line following a line terminator.
+
+        Args:
+            mapped_file: Memory map of the file
+            line_end: Offset of the line terminator
+
+        Returns:
+            Offset of the next line start
+        """
+        if mapped_file[line_end:line_end + 2] == b"\r\n":
+            return line_end + 2
+        return line_end + 1
+
+    @staticmethod
+    def _count_lines(mapped_file: mmap.mmap, start: int, end: int) -> int:
+        """Count the lines in a region of a memory-mapped file.
+
+        Args:
+            mapped_file: Memory map of the file
+            start: Offset of the first line start in the region
+            end: Offset of the region end, a line start as well
+
+        Returns:
+            Number of lines found in the region
+        """
+        lines_count = 0
+        line_start = start
+
+        while line_start < end:
+            lines_count += 1
+            line_start = CSVFile._next_line_start(
+                mapped_file, CSVFile._find_line_end(mapped_file, line_start)
+            )
+        return lines_count
+
+    @staticmethod
+    def _bisect_lines(
+            mapped_file: mmap.mmap,
+            line_start: int,
+            is_before: Callable[[bytes], bool]
+    ) -> int:
+        """Binary search the first line that is not before a position.
+
+        Lines are probed directly by their byte offset, so no index of
+        the line offsets has to be built beforehand.
+
+        Args:
+            mapped_file: Memory map of the file
+            line_start: Offset of the line to start searching from
+            is_before: Predicate which holds for a leading run of lines only
+
+        Returns:
+            Offset of the first line for which is_before doesn't hold
+        """
+        find_line_end = CSVFile._find_line_end
+        next_line_start = CSVFile._next_line_start
+        low, high = line_start, len(mapped_file)
+
+        while low < high:
+            # Probe the first line starting at or after the middle, or the
+            # lowest line if there is none before the upper bound
+            middle = (low + high) // 2
+            middle_start = low
+            if middle > low:
+                middle_start = next_line_start(
+                    mapped_file, find_line_end(mapped_file, middle - 1)
+                )
+                if middle_start >= high:
+                    middle_start = low
+            middle_end = find_line_end(mapped_file, middle_start)
+
+            if is_before(mapped_file[middle_start:middle_end]):
+                low = next_line_start(mapped_file, middle_end)
+            else:
+                high = middle_start
+        return min(low, len(mapped_file))
+
+    def _iter_mapped_lines(
+            self, mapped_file: mmap.mmap, line_start: int = 0
+    ) -> Iterator[bytes]:
+        """Iterate through the raw lines of a memory-mapped file.
+
+        The file is split into lines a block at a time, so the newline
+        scanning happens in C instead of a find() call per line. Lines may
+        end with "\n", "\r" or "\r\n", as in text mode.
+
+        Args:
+            mapped_file: Memory map of the file
+            line_start: Offset of the first line to yield
+
+        Yields:
+            Raw bytes of each line, without the line terminator
+        """
+        rfind = mapped_file.rfind
+        file_size = len(mapped_file)
+
+        while line_start < file_size:
+            block_end = rfind(
+                b"\n", line_start, line_start + self.READ_BLOCK_SIZE
+            )
+            if block_end == -1:
+                # The block holds no complete "\n" line, take the next one
+                block_end = self._find_line_end(mapped_file, line_start)
+            # Keep the terminator so that empty lines at the block end count
+            yield from mapped_file[line_start:block_end + 1].splitlines()
+            line_start = self._next_line_start(mapped_file, block_end)
+
+    def _iter_lines(
+            self,
+            skip_header: bool = True,
+            is_before: Optional[Callable[[bytes], bool]] = None
+    ) -> Iterator[bytes]:
+        """Iterate through the raw, undecoded lines of the CSV file.
+
+        File-backed streams are memory-mapped and other streams are read
+        in large blocks. Either way newlines are found in C, which avoids
+        decoding and allocating a str for every line.
+
+        Args:
+            skip_header: Whether to skip the header line
+            is_before: Predicate which holds for a leading run of lines
+                only. When the file is memory-mapped, those lines are
+                skipped with a binary search. Other streams are read from
+                the beginning, so callers must still handle them.
+
+        Yields:
+            Raw bytes of each line, without the line terminator
+        """
+        self.goto_beginning()
+        mapped_file = self._map_file()
+
+        if mapped_file is None:
+            lines = self._iter_stream_lines()
+            if skip_header:
+                next(lines, None)
+                self._current_line_number += 1
+            for line in lines:
+                self._current_line_number += 1
+                yield line
+            return
+
+        try:
+            # Read the header line on its own, so that getting the headers
+            # doesn't split a whole block
+            header_end = self._find_line_end(mapped_file, 0)
+            self._current_line_number += 1
+            if not skip_header:
+                yield mapped_file[:header_end]
+            line_start = self._next_line_start(mapped_file, header_end)
+
+            if is_before is not None:
+                first_line_start = self._bisect_lines(
+                    mapped_file, line_start, is_before
+                )
+                self._skipped_lines = (
+                    mapped_file, line_start, first_line_start
+                )
+                line_start = first_line_start
+            for line in self._iter_mapped_lines(mapped_file, line_start):
+                self._current_line_number += 1
+                yield line
+        finally:
+            # A map still referenced by unresolved skipped lines is released
+            # once they are resolved or the file is read again
+            if (
+                self._skipped_lines is None
+                or self._skipped_lines[0] is not mapped_file
+            ):
+                mapped_file.close()
 
     def get_headers(self) -> list[str]:
         """Extract header names from the CSV file.
 
+        The header line is read like any other line by _iter_lines.
+
         Returns:
             List of header names
         """
-        self.goto_beginning()
-        headers_line = self._file_stream.readline()
-        self._current_line_number += 1
+        lines = self._iter_lines(skip_header=False)
+        headers_line = next(lines, b"")
+        lines.close()
 
-        return self.extract_data_from_line(headers_line)
+        return self.extract_data_from_line(self._decode(headers_line))
 
     def iter_rows(self, skip_header: bool = True) -> Iterator[list[str]]:
         """Iterate through rows in the CSV file.
 
+        Rows are read by _iter_lines, so they follow the same line rule as
+        the raw lines scanned by subclasses.
+
         Args:
             skip_header: Whether to skip the header row
 
         Yields:
             List of values for each row
         """
-        self.goto_beginning()
+        decode = self._decode
+        extract_data_from_line = self.extract_data_from_line
 
-        if skip_header:
-            self._file_stream.readline()
-            self._current_line_number += 1
-        for line in self._file_stream:
-            self._current_line_number += 1
-            yield self.extract_data_from_line(line)
+        for line in self._iter_lines(skip_header=skip_header):
+            yield extract_data_from_line(decode(line))
 
 
 class CookiesAnalyzer(CSVFile):
@@ -79,7 +373,9 @@ class CookiesAnalyzer(CSVFile):
 
     def __init__(self, file_stream: TextIO) -> None:
         super().__init__(file_stream)
-        self._data_parsers = self._init_data_parsers()
+        headers_idx = self._init_headers_idx()
+        self._cookie_idx = headers_idx[self.COOKIE_HEADER]
+        self._timestamp_idx = headers_idx[self.TIMESTAMP_HEADER]
 
     def _cookie_parser(self, value: str) -> str:
         """Parse and validate a cookie value.
@@ -95,7 +391,7 @@ class CookiesAnalyzer(CSVFile):
         """
         if len(value) == 0:
             raise ValueError(
-                f"cookie is not correctly formatted on line {self._current_line_number}: '{value}'"
+                f"cookie is not correctly formatted on line {self._resolve_line_number()}: '{value}'"
             )
         return value
 
@@ -115,69 +411,146 @@ class CookiesAnalyzer(CSVFile):
             parsed_value = datetime.fromisoformat(value)
         except ValueError:
             raise ValueError(
-                f"timestamp is not correctly formatted on line {self._current_line_number}: '{value}'"
+                f"timestamp is not correctly formatted on line {self._resolve_line_number()}: '{value}'"
             )
         return parsed_value
 
-    def _init_data_parsers(self) -> list[CookiesDataParser]:
-        """Create data parsers for each column based on headers.
+    def _init_headers_idx(self) -> dict[str, int]:
+        """Map each header to the index of its column.
 
         Returns:
-            List of data parsers for supported columns
+            Mapping of header names to column indices
 
         Raises:
-            ValueError: If an unsupported header is found
-        """
-        data_parsers: list[CookiesDataParser] = []
-        headers_list = self.get_headers()
-
-        for header in headers_list:
-            if header == self.COOKIE_HEADER:
-                data_parsers.append(
-                    CookiesDataParser(
-                        header_name=self.COOKIE_HEADER,
-                        parsing_func=self._cookie_parser
-                    )
+            ValueError: If an unsupported, duplicate or missing header is found
+        """
+        headers_idx: dict[str, int] = {}
+        supported_headers = (self.COOKIE_HEADER, self.TIMESTAMP_HEADER)
+
+        for i, header in enumerate(self.get_headers()):
+            if header not in supported_headers:
+                raise ValueError(
+                    f"unsupported header detected: '{header}'"
                 )
-            elif header == self.TIMESTAMP_HEADER:
-                data_parsers.append(
-                    CookiesDataParser(
-                        header_name=self.TIMESTAMP_HEADER,
-                        parsing_func=self._timestamp_parser
-                    )
+            if header in headers_idx:
+                raise ValueError(
+                    f"duplicate header detected: '{header}'"
                 )
-            else:
+            headers_idx[header] = i
+        for header in supported_headers:
+            if header not in headers_idx:
                 raise ValueError(
-                    f"unsupported header detected: '{header}'"
+                    f"missing header: '{header}'"
                 )
-        return data_parsers
+        return headers_idx
+
+    @staticmethod
+    def _fast_split(
+            line: bytes, separator: bytes
+    ) -> Optional[tuple[bytes, bytes]]:
+        """Split a raw log line into its two values.
+
+        Log lines have exactly two columns, so only the first separator
+        has to be found. Any extra columns are left in the second value.
+
+        Args:
+            line: Raw log line
+            separator: Encoded CSV delimiter
+
+        Returns:
+            Raw values of both columns, or None if the separator is missing
+        """
+        separator_idx = line.find(separator)
+        if separator_idx == -1:
+            return None
+        return line[:separator_idx], line[separator_idx + 1:]
 
-    def _parse_cookie_log(self, row_data: list[str]) -> CookieLog:
-        """Parse row data into a CookieLog object.
+    def _is_after_date(self, line: bytes, target_prefix: bytes) -> bool:
+        """Check if a raw log line was recorded after the specified date.
 
         Args:
-            row_data: CSV row values
+            line: Raw log line
+            target_prefix: Encoded ISO-formatted date
 
         Returns:
-            CookieLog object with parsed data
+            True if the entry is more recent than the date, False otherwise
+            or if the line is malformed
+        """
+        row_data = self._fast_split(line, self._raw_separator)
+        if row_data is None:
+            return False
+        timestamp = self._strip(row_data[self._timestamp_idx])
+        return (
+            timestamp > target_prefix
+            and not timestamp.startswith(target_prefix)
+        )
+
+    def _iter_target_cookies(self, target_date: date) -> Iterator[bytes]:
+        """Iterate through cookies recorded on the specified date.
+
+        Args:
+            target_date: Date to filter cookies by
+
+        Yields:
+            Raw cookie ID of each log entry recorded on the target date
 
         Raises:
             ValueError: If data is corrupt or column count mismatch
         """
-        row_data_len = len(row_data)
-        cookie_log = {}
+        parse_cookie = self._cookie_parser
+        parse_timestamp = self._timestamp_parser
+        cookie_idx = self._cookie_idx
+        timestamp_idx = self._timestamp_idx
+        decode = self._decode
+        fast_split = self._fast_split
+        strip = self._strip
+        whitespace = self.ASCII_WHITESPACE
+        separator = self._raw_separator
+        # ISO-8601 timestamps start with their date, so comparing the
+        # "YYYY-MM-DD" prefix is equivalent to comparing parsed dates
+        target_prefix = target_date.isoformat().encode(self._encoding)
+
+        # Optimization: logs are sorted, so jump over the more recent
+        # entries with a binary search when the file allows it
+        lines = self._iter_lines(
+            skip_header=True,
+            is_before=lambda line: self._is_after_date(line, target_prefix)
+        )
 
-        if row_data_len != len(self._data_parsers):
-            raise ValueError(
-                f"columns count is inconsistent on line {self._current_line_number}"
-            )
-        for i in range(row_data_len):
-            value = row_data[i]
-            data_parser = self._data_parsers[i]
-            cookie_log[data_parser.header_name] = data_parser.parsing_func(
-                value
-            )
-        return CookieLog(**cookie_log)
+        # Read the columns straight from the raw line instead of building
+        # an object for every entry
+        for line in lines:
+            row_data = fast_split(line, separator)
+            if row_data is None:
+                raise ValueError(
+                    f"columns count is inconsistent on line {self._resolve_line_number()}"
+                )
+            # Optimization: filter by the cheap date prefix comparison
+            # first and only validate the values of the relevant entries.
+            # Comparing the whole timestamp against the prefix gives the
+            # same ordering without slicing a new object for every row.
+            timestamp = row_data[timestamp_idx].strip(whitespace)
+            if not timestamp.isascii():
+                timestamp = strip(timestamp)
+            is_past_target = timestamp < target_prefix
+            if not is_past_target and not timestamp.startswith(target_prefix):
+                continue
+
+            # Extra columns end up in the second value
+            if separator in row_data[1]:
+                raise ValueError(
+                    f"columns count is inconsistent on line {self._resolve_line_number()}"
+                )
+            parse_timestamp(decode(timestamp))
+
+            # Optimization: stop once we're past the target date
+            if is_past_target:
+                return
+            cookie = strip(row_data[cookie_idx])
+            if not cookie:
+                # Let the parser report the invalid value
+                parse_cookie(decode(cookie))
+            yield cookie
 
     def _get_cookies_analysis(
             self, target_date: date
@@ -188,24 +561,33 @@ class CookiesAnalyzer(CSVFile):
             target_date: Date to filter cookies by
 
         Returns:
-            Analysis with cookie counts and maximum count
+            Analysis with cookie counts, maximum count and most active cookies
         """
         max_count = 0
-        cookie_counts: dict[str, int] = {}
-
-        for row_data in self.iter_rows(skip_header=True):
-            cookie_log = self._parse_cookie_log(row_data)
+        most_active: list[bytes] = []
+        raw_cookie_counts: dict[bytes, int] = {}
+        get_count = raw_cookie_counts.get
+
+        # Track the most active cookies while counting, so they don't have
+        # to be picked by traversing the counts afterwards. Counting the raw
+        # values means each distinct cookie is decoded once, not per entry.
+        for cookie in self._iter_target_cookies(target_date):
+            count = get_count(cookie, 0) + 1
+            raw_cookie_counts[cookie] = count
+            if count > max_count:
+                max_count = count
+                most_active = [cookie]
+            elif count == max_count:
+                most_active.append(cookie)
+        decode = self._decode
 
-            # Optimization: stop once we're past the target date
-            if cookie_log.timestamp.date() < target_date:
-                break
-            if cookie_log.timestamp.date() == target_date:
-                count = cookie_counts.get(cookie_log.cookie, 0) + 1
-                cookie_counts[cookie_log.cookie] = count
-                max_count = max(max_count, count)
         return CookiesAnalysis(
-            cookies_count_map=cookie_counts,
-            max_count=max_count
+            cookies_count_map={
+                decode(cookie): count
+                for cookie, count in raw_cookie_counts.items()
+            },
+            max_count=max_count,
+            most_active=[decode(cookie) for cookie in most_active]
         )
 
     def get_most_active(self, target_date: date) -> list[str]:
@@ -217,10 +599,4 @@ class CookiesAnalyzer(CSVFile):
         Returns:
             List of cookie IDs with highest occurrence count
         """
-        most_active = []
-        cookies_analysis = self._get_cookies_analysis(target_date)
-
-        for cookie, count in cookies_analysis.cookies_count_map.items():
-            if count == cookies_analysis.max_count:
-                most_active.append(cookie)
-        return most_active
+        return self._get_cookies_analysis(target_date).most_active
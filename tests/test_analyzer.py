@@ -1,11 +1,23 @@
 import io
+import os
 import unittest
+import tempfile
 from datetime import datetime, date
+from unittest.mock import patch
 
 from cookie_analyzer.analyzer import CSVFile, CookiesAnalyzer
 
 
-class TestCSVFile(unittest.TestCase):
+class TempFileTestCase(unittest.TestCase):
+    def _write_temp_file(self, content):
+        # Write content to a temporary file removed after the test
+        with tempfile.NamedTemporaryFile(mode="w", delete=False) as temp_file:
+            temp_file.write(content)
+        self.addCleanup(os.unlink, temp_file.name)
+        return temp_file.name
+
+
+class TestCSVFile(TempFileTestCase):
     def test_extract_data_from_line(self):
         line = "value1, value2 ,value3"
         expected = ["value1", "value2", "value3"]
@@ -31,8 +43,67 @@ class TestCSVFile(unittest.TestCase):
         self.assertEqual(rows[0], ["value1", "value2"])
         self.assertEqual(rows[1], ["value3", "value4"])
 
+    def test_iter_rows_strips_whitespace(self):
+        file_content = "header1,\theader2\n value1 ,value2 \n"
+        file_stream = io.StringIO(file_content)
+        csv_file = CSVFile(file_stream)
+
+        self.assertEqual(csv_file.get_headers(), ["header1", "header2"])
+        self.assertEqual(list(csv_file.iter_rows()), [["value1", "value2"]])
+
+    def test_iter_rows_from_file(self):
+        # Headers and rows are read with the same line and strip rules
+        temp_file_name = self._write_temp_file(
+            "header1,\x1cheader2\rvalue1\x1f,value2\r\nvalue3,value4"
+        )
+
+        with open(temp_file_name, "r") as file_stream:
+            csv_file = CSVFile(file_stream)
+            headers = csv_file.get_headers()
+            rows = list(csv_file.iter_rows())
+
+        self.assertEqual(headers, ["header1", "header2"])
+        self.assertEqual(rows, [["value1", "value2"], ["value3", "value4"]])
+
+    @patch.object(CSVFile, "READ_BLOCK_SIZE", 4)
+    def test_iter_lines(self):
+        # Lines spanning several read blocks are joined back together
+        file_content = "header1,header2\nvalue1,value2\nvalue3,value4"
+        file_stream = io.StringIO(file_content)
+        csv_file = CSVFile(file_stream)
+
+        lines = list(csv_file._iter_lines())
+        self.assertEqual(lines, [b"value1,value2", b"value3,value4"])
+        self.assertEqual(csv_file._current_line_number, 3)
+
+    @patch.object(CSVFile, "READ_BLOCK_SIZE", 8)
+    def test_iter_lines_from_file(self):
+        # Memory-mapped files are split into lines block by block
+        temp_file_name = self._write_temp_file(
+            "header1,header2\nvalue1,value2\nv3,v4\nvalue5,value6"
+        )
+
+        with open(temp_file_name, "r") as file_stream:
+            csv_file = CSVFile(file_stream)
+            lines = list(csv_file._iter_lines())
 
-class TestCookiesAnalyzer(unittest.TestCase):
+        self.assertEqual(lines, [b"value1,value2", b"v3,v4", b"value5,value6"])
+        self.assertEqual(csv_file._current_line_number, 4)
+
+    def test_resolve_line_number(self):
+        # Lines skipped by the binary search are counted when needed,
+        # even once the stream has been closed
+        temp_file_name = self._write_temp_file("header\na\nb\r\nc\rd\n")
+
+        with open(temp_file_name, "r") as file_stream:
+            csv_file = CSVFile(file_stream)
+            lines = list(csv_file._iter_lines(is_before=lambda line: line < b"c"))
+
+        self.assertEqual(lines, [b"c", b"d"])
+        self.assertEqual(csv_file._resolve_line_number(), 5)
+
+
+class TestCookiesAnalyzer(TempFileTestCase):
     def setUp(self):
         # Sample cookie log data
         self.log_data = (
@@ -60,23 +131,35 @@ class TestCookiesAnalyzer(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.analyzer._timestamp_parser("invalid-timestamp")
 
-    def test_init_data_parsers(self):
-        parsers = self.analyzer._data_parsers
-        self.assertEqual(len(parsers), 2)
-        self.assertEqual(parsers[0].header_name, "cookie")
-        self.assertEqual(parsers[1].header_name, "timestamp")
-
-    def test_parse_cookie_log(self):
-        log = self.analyzer._parse_cookie_log(["cookie1", "2021-12-09T14:19:00+00:00"])
-        self.assertEqual(log.cookie, "cookie1")
+    def test_init_headers_idx(self):
         self.assertEqual(
-            log.timestamp,
-            datetime.fromisoformat("2021-12-09T14:19:00+00:00")
+            self.analyzer._init_headers_idx(),
+            {"cookie": 0, "timestamp": 1}
         )
+        self.assertEqual(self.analyzer._cookie_idx, 0)
+        self.assertEqual(self.analyzer._timestamp_idx, 1)
+
+        # Test unsupported, duplicate and missing headers
+        for headers in ("cookie,timestamp,extra", "cookie,cookie", "cookie"):
+            with self.assertRaises(ValueError):
+                CookiesAnalyzer(io.StringIO(f"{headers}\n"))
+
+    def test_get_cookies_analysis_invalid_row_length(self):
+        invalid_stream = io.StringIO(
+            "cookie,timestamp\n"
+            "cookie1\n"
+        )
+        invalid_analyzer = CookiesAnalyzer(invalid_stream)
 
-        # Test invalid row length
         with self.assertRaises(ValueError):
-            self.analyzer._parse_cookie_log(["cookie1"])
+            invalid_analyzer._get_cookies_analysis(date(2021, 12, 9))
+
+    def test_fast_split(self):
+        self.assertEqual(
+            CookiesAnalyzer._fast_split(b"cookie1,2021-12-09T14:19:00+00:00", b","),
+            (b"cookie1", b"2021-12-09T14:19:00+00:00")
+        )
+        self.assertIsNone(CookiesAnalyzer._fast_split(b"cookie1", b","))
 
     def test_get_cookies_analysis(self):
         # Test for Dec 9, 2021 (two occurrences of cookie1, one of cookie2)
@@ -87,6 +170,7 @@ class TestCookiesAnalyzer(unittest.TestCase):
         self.assertEqual(analysis.cookies_count_map["cookie1"], 2)
         self.assertEqual(analysis.cookies_count_map["cookie2"], 1)
         self.assertNotIn("cookie3", analysis.cookies_count_map)
+        self.assertEqual(analysis.most_active, ["cookie1"])
 
         # Test for Dec 8, 2021 (one occurrence of cookie3)
         target_date = date(2021, 12, 8)
@@ -96,6 +180,117 @@ class TestCookiesAnalyzer(unittest.TestCase):
         self.assertEqual(analysis.cookies_count_map["cookie3"], 1)
         self.assertNotIn("cookie1", analysis.cookies_count_map)
 
+    def test_init_headers_idx_whitespace(self):
+        # Headers are stripped like the values of each row
+        analyzer = CookiesAnalyzer(io.StringIO("cookie,\ttimestamp \n"))
+        self.assertEqual(analyzer._timestamp_idx, 1)
+
+        with self.assertRaises(ValueError):
+            CookiesAnalyzer(io.StringIO('"cookie","timestamp"\n'))
+
+    def test_get_cookies_analysis_non_ascii_whitespace(self):
+        # Values are stripped like str.strip() does, including the ASCII
+        # separator characters bytes.strip() keeps
+        analyzer = CookiesAnalyzer(io.StringIO(
+            "cookie,timestamp\n"
+            "cookie1\u00a0,2021-12-09T14:19:00+00:00\u00a0\n"
+            "cookie1,\u00a02021-12-09T10:13:00+00:00\n"
+            "\x1ccookie1\x1f,2021-12-09T09:13:00+00:00\x1d\n"
+            "cookie1\x1e,\x0b2021-12-09T08:13:00+00:00\x0c\n"
+        ))
+        analysis = analyzer._get_cookies_analysis(date(2021, 12, 9))
+
+        self.assertEqual(analysis.cookies_count_map, {"cookie1": 4})
+
+    def test_get_cookies_analysis_extra_columns(self):
+        # Extra columns are rejected for both header orders
+        for log_data in (
+            "cookie,timestamp\n"
+            "cookie1,2021-12-09T14:19:00+00:00,extra\n",
+            "timestamp,cookie\n"
+            "2021-12-09T14:19:00+00:00,cookie1,extra\n",
+        ):
+            invalid_analyzer = CookiesAnalyzer(io.StringIO(log_data))
+
+            with self.assertRaisesRegex(ValueError, "columns count"):
+                invalid_analyzer._get_cookies_analysis(date(2021, 12, 9))
+
+    def test_get_cookies_analysis_invalid_timestamp(self):
+        # Entries on the target date are still fully validated
+        invalid_stream = io.StringIO(
+            "cookie,timestamp\n"
+            "cookie1,2021-12-09T14:19:00+00:00\n"
+            "cookie2,2021-12-09Tinvalid\n"
+        )
+        invalid_analyzer = CookiesAnalyzer(invalid_stream)
+
+        with self.assertRaises(ValueError):
+            invalid_analyzer._get_cookies_analysis(date(2021, 12, 9))
+
+    def test_get_cookies_analysis_invalid_cookie(self):
+        invalid_stream = io.StringIO(
+            "cookie,timestamp\n"
+            "cookie1,2021-12-09T14:19:00+00:00\n"
+            ",2021-12-09T10:13:00+00:00\n"
+        )
+        invalid_analyzer = CookiesAnalyzer(invalid_stream)
+
+        with self.assertRaises(ValueError):
+            invalid_analyzer._get_cookies_analysis(date(2021, 12, 9))
+
+    def test_get_cookies_analysis_from_file(self):
+        # File-backed streams are scanned through a memory map
+        temp_file_name = self._write_temp_file(self.log_data)
+
+        with open(temp_file_name, "r") as file_stream:
+            analyzer = CookiesAnalyzer(file_stream)
+            analysis = analyzer._get_cookies_analysis(date(2021, 12, 9))
+
+        self.assertEqual(analysis.max_count, 2)
+        self.assertEqual(analysis.cookies_count_map, {"cookie1": 2, "cookie2": 1})
+
+    def test_get_cookies_analysis_from_file_line_endings(self):
+        # Lines of memory-mapped files may end like in text mode
+        for line_ending in ("\r", "\r\n"):
+            temp_file_name = self._write_temp_file(
+                self.log_data.replace("\n", line_ending)
+            )
+
+            with open(temp_file_name, "r") as file_stream:
+                analyzer = CookiesAnalyzer(file_stream)
+                analysis = analyzer._get_cookies_analysis(date(2021, 12, 9))
+
+            self.assertEqual(
+                analysis.cookies_count_map, {"cookie1": 2, "cookie2": 1}
+            )
+
+    def test_get_cookies_analysis_from_file_line_number(self):
+        # Line numbers stay accurate when skipping to the target date
+        temp_file_name = self._write_temp_file(
+            "cookie,timestamp\n"
+            "cookie1,2021-12-09T14:19:00+00:00\n"
+            "cookie2,2021-12-09T10:13:00+00:00\n"
+            "cookie1,2021-12-09T07:25:00+00:00\n"
+            "cookie3,2021-12-08Tinvalid\n"
+        )
+
+        with open(temp_file_name, "r") as file_stream:
+            analyzer = CookiesAnalyzer(file_stream)
+            with self.assertRaisesRegex(ValueError, "on line 5"):
+                analyzer._get_cookies_analysis(date(2021, 12, 8))
+
+    def test_get_cookies_analysis_file_modification_time(self):
+        # Results don't depend on the file modification time
+        temp_file_name = self._write_temp_file(self.log_data)
+        modification_time = datetime(2021, 12, 1).timestamp()
+        os.utime(temp_file_name, (modification_time, modification_time))
+
+        with open(temp_file_name, "r") as file_stream:
+            analyzer = CookiesAnalyzer(file_stream)
+            analysis = analyzer._get_cookies_analysis(date(2021, 12, 9))
+
+        self.assertEqual(analysis.cookies_count_map, {"cookie1": 2, "cookie2": 1})
+
     def test_get_most_active(self):
         # Test for Dec 9, 2021 (cookie1 is most active)
         cookies = self.analyzer.get_most_active(date(2021, 12, 9))